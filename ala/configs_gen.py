@@ -1,21 +1,38 @@
 import requests
+from requests.adapters import HTTPAdapter
 import re
 import json
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
 from datetime import datetime, timezone, timedelta
+import logging
 import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from create_configs_json import build_config
-from country_utils import country_name_from_code, code_to_flag
+from json_utils import write_json
+from country_utils import country_info
+
+log = logging.getLogger(__name__)
 
 SPECIAL_CASES = {'HK': 'Hong Kong', 'TW': 'Taiwan', 'MO': 'Macau'}
 
+# One pooled session so repeated requests to the same GitHub hosts reuse
+# their keep-alive connections instead of paying a new TLS handshake each.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=2))
+
+# ETags and parsed configs from the previous run, for conditional GETs
+FETCH_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fetch_cache.json')
+
+# Matches one line of: Country: XX, Speed: XXXX.XX Mbps, Config: vless://...
+_LINE_RE = re.compile(r'Country:\s*([A-Z]{2}),\s*Speed:\s*([\d.]+)\s*Mbps,\s*Config:\s*(.+)')
+
+@lru_cache(maxsize=None)
 def get_country_info(country_code):
     """Get country name and flag emoji from a country code."""
-    return (
-        country_name_from_code(country_code, special_cases=SPECIAL_CASES),
-        code_to_flag(country_code),
-    )
+    return country_info(country_code, special_cases=SPECIAL_CASES)
 
 def check_file_last_commit(file_path):
     """Check if a file's last commit was less than 2 hours ago"""
@@ -27,13 +44,13 @@ def check_file_last_commit(file_path):
             'per_page': 1  # We only need the latest commit
         }
         
-        print(f"Checking last commit time for {file_path}...")
-        response = requests.get(api_url, params=params)
+        log.info(f"Checking last commit time for {file_path}...")
+        response = _SESSION.get(api_url, params=params, timeout=30)
         response.raise_for_status()
         
         commits = response.json()
         if not commits:
-            print(f"❌ No commits found for {file_path}")
+            log.warning(f"❌ No commits found for {file_path}")
             return False
         
         # Get the commit date
@@ -45,29 +62,27 @@ def check_file_last_commit(file_path):
         time_diff = now - commit_date
         hours_ago = time_diff.total_seconds() / 3600
         
-        print(f"📅 {file_path} last commit: {commit_date.strftime('%Y-%m-%d %H:%M:%S UTC')} ({hours_ago:.1f} hours ago)")
+        log.info(f"📅 {file_path} last commit: {commit_date.strftime('%Y-%m-%d %H:%M:%S UTC')} ({hours_ago:.1f} hours ago)")
         
         # Return True if less than 2 hours ago
         is_recent = hours_ago < 2
         if is_recent:
-            print(f"✅ {file_path} is recent (less than 2 hours ago)")
+            log.info(f"✅ {file_path} is recent (less than 2 hours ago)")
         else:
-            print(f"❌ {file_path} is too old (more than 2 hours ago)")
+            log.info(f"❌ {file_path} is too old (more than 2 hours ago)")
         
         return is_recent
         
     except requests.RequestException as e:
-        print(f"❌ Error checking commit time for {file_path}: {e}")
+        log.error(f"❌ Error checking commit time for {file_path}: {e}")
         return False
     except Exception as e:
-        print(f"❌ Error processing commit data for {file_path}: {e}")
+        log.error(f"❌ Error processing commit data for {file_path}: {e}")
         return False
 
 def parse_config_line(line):
     """Parse a single configuration line and extract country, speed, and config"""
-    # Pattern to match: Country: XX, Speed: XXXX.XX Mbps, Config: vless://...
-    pattern = r'Country:\s*([A-Z]{2}),\s*Speed:\s*([\d.]+)\s*Mbps,\s*Config:\s*(.+)'
-    match = re.match(pattern, line.strip())
+    match = _LINE_RE.match(line.strip())
     
     if match:
         country_code = match.group(1)
@@ -76,42 +91,61 @@ def parse_config_line(line):
         return country_code, speed, config
     return None, None, None
 
-def fetch_configs_from_url(url):
-    """Fetch and parse configs from a given URL"""
+def load_fetch_cache():
+    """Load the per-URL ETag and parsed configs saved by the previous run"""
+    try:
+        with open(FETCH_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_fetch_cache(cache):
+    """Persist the per-URL ETag and parsed configs for the next run"""
+    try:
+        with open(FETCH_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+    except OSError as e:
+        log.warning(f"⚠️ Could not save fetch cache: {e}")
+
+def fetch_configs_from_url(url, cache=None):
+    """Fetch and parse configs from a given URL as (country_code, speed, config) tuples
+
+    If ``cache`` holds an ETag for the URL it is sent as ``If-None-Match`` and a
+    304 reply reuses the cached configs. Fresh replies update ``cache`` in place.
+    """
+    cached = cache.get(url) if cache is not None else None
     try:
-        print(f"Fetching data from {url}...")
-        response = requests.get(url)
+        log.info(f"Fetching data from {url}...")
+        headers = {'If-None-Match': cached['etag']} if cached else {}
+        response = _SESSION.get(url, headers=headers, timeout=30, stream=True)
+        if response.status_code == 304 and cached:
+            response.close()
+            log.info(f"{url} not modified, reusing {len(cached['configs'])} cached configs")
+            return cached['configs']
         response.raise_for_status()
+        if response.encoding is None:
+            response.encoding = 'utf-8'
         
-        # Parse the content
-        lines = response.text.strip().split('\n')
+        # Parse lines as they arrive instead of buffering the whole body
         configs = []
+        for line in response.iter_lines(decode_unicode=True):
+            country_code, speed, config = parse_config_line(line)
+            if country_code and config:
+                configs.append((country_code, speed, config))
         
-        for line in lines:
-            if line.strip():  # Skip empty lines
-                country_code, speed, config = parse_config_line(line)
-                if country_code and config:
-                    configs.append({
-                        'country_code': country_code,
-                        'speed': speed,
-                        'config': config
-                    })
+        etag = response.headers.get('ETag')
+        if cache is not None and etag:
+            cache[url] = {'etag': etag, 'configs': configs}
         
         return configs
         
     except requests.RequestException as e:
-        print(f"❌ Error fetching data from {url}: {e}")
+        log.error(f"❌ Error fetching data from {url}: {e}")
         return []
     except Exception as e:
-        print(f"❌ Error processing data from {url}: {e}")
+        log.error(f"❌ Error processing data from {url}: {e}")
         return []
 
-def extract_config_identifier(config):
-    """Extract a unique identifier from a config string for comparison"""
-    # Use the config string itself as identifier, or you could extract specific parts
-    # depending on the config format (e.g., server address, port, etc.)
-    return config.strip()
-
 def fetch_and_process_configs():
     """Main function to fetch, parse, and process VPN configurations"""
     urls = {
@@ -126,35 +160,49 @@ def fetch_and_process_configs():
         'tuco': 'configs-tuco.txt'
     }
     
+    fetch_cache = load_fetch_cache()
+    
     try:
+        # Run the commit-time checks and all fetches concurrently so the
+        # network round trips overlap; stale sources are discarded afterwards.
+        with ThreadPoolExecutor(max_workers=len(urls) + len(file_paths)) as executor:
+            recent_futures = {
+                source: executor.submit(check_file_last_commit, path)
+                for source, path in file_paths.items()
+            }
+            fetch_futures = {
+                source: executor.submit(fetch_configs_from_url, url, fetch_cache)
+                for source, url in urls.items()
+            }
+        save_fetch_cache(fetch_cache)
+        
         # Check commit times for gonzo and tuco files
         valid_sources = ['main']  # Always include main
         
         for source in ['gonzo', 'tuco']:
-            if check_file_last_commit(file_paths[source]):
+            if recent_futures[source].result():
                 valid_sources.append(source)
             else:
-                print(f"⚠️ Skipping {source} due to old commit time")
+                log.warning(f"⚠️ Skipping {source} due to old commit time")
         
-        print(f"\nValid sources to process: {valid_sources}")
+        log.info(f"\nValid sources to process: {valid_sources}")
         
-        # Fetch configs from valid URLs only
+        # Keep configs from valid URLs only
         all_configs = {}
         for source in valid_sources:
-            all_configs[source] = fetch_configs_from_url(urls[source])
-            print(f"Fetched {len(all_configs[source])} configs from {source}")
+            all_configs[source] = fetch_futures[source].result()
+            log.info(f"Fetched {len(all_configs[source])} configs from {source}")
         
         # If we only have main configs, use them directly
         if len(valid_sources) == 1 and valid_sources[0] == 'main':
-            print("Only main configs available, using them directly")
+            log.info("Only main configs available, using them directly")
             configs_to_process = all_configs['main']
         else:
             # Create a set of main config identifiers for comparison
-            main_config_identifiers = set()
-            for config_item in all_configs['main']:
-                main_config_identifiers.add(extract_config_identifier(config_item['config']))
+            # Configs are already trimmed at parse time, so they are their own identifiers
+            main_config_identifiers = {config for _, _, config in all_configs['main']}
             
-            print(f"Main configs set contains {len(main_config_identifiers)} unique configs")
+            log.info(f"Main configs set contains {len(main_config_identifiers)} unique configs")
             
             # Process valid gonzo and tuco configs, keeping only those that exist in main
             filtered_configs = []
@@ -163,56 +211,49 @@ def fetch_and_process_configs():
                 if source not in valid_sources:
                     continue
                     
-                print(f"\nProcessing {source} configs...")
-                matching_configs = []
-                
-                for config_item in all_configs[source]:
-                    config_id = extract_config_identifier(config_item['config'])
-                    #if config_id in main_config_identifiers:
-                    matching_configs.append(config_item)
+                log.info(f"\nProcessing {source} configs...")
+                # The membership filter is disabled for now; re-enable with:
+                # [item for item in all_configs[source] if item[2] in main_config_identifiers]
+                matching_configs = list(all_configs[source])
                 
-                print(f"Found {len(matching_configs)} {source} configs that match main configs")
+                log.info(f"Found {len(matching_configs)} {source} configs that match main configs")
                 filtered_configs.extend(matching_configs)
             
-            print(f"\nTotal filtered configs from valid sources: {len(filtered_configs)}")
+            log.info(f"\nTotal filtered configs from valid sources: {len(filtered_configs)}")
             
             # Decide which configs to use
             if len(filtered_configs) >= 0:
-                print("Using filtered configs from valid sources (>=10 configs found)")
+                log.info("Using filtered configs from valid sources (>=10 configs found)")
                 configs_to_process = filtered_configs
             else:
-                print("Less than 10 filtered configs found, falling back to main configs")
+                log.info("Less than 10 filtered configs found, falling back to main configs")
                 configs_to_process = all_configs['main']
         
         # Group configs by country
         country_configs = defaultdict(list)
         
-        print(f"Processing {len(configs_to_process)} configurations...")
-        for config_item in configs_to_process:
-            country_code = config_item['country_code']
-            country_configs[country_code].append({
-                'speed': config_item['speed'],
-                'config': config_item['config']
-            })
+        log.info(f"Processing {len(configs_to_process)} configurations...")
+        for country_code, speed, config in configs_to_process:
+            country_configs[country_code].append((speed, config))
         # Build final configs array
         configs = []
+        country_summary = {}
         
-        print("Building final configurations by country...")
+        log.info("Building final configurations by country...")
         for country_code, config_list in country_configs.items():
             # if len(config_list) < 5:
             #     continue
                 
             country_name, flag_emoji = get_country_info(country_code)
+            country_summary[country_name] = len(config_list)
             
-            print(f"Processing {len(config_list)} configs for {country_name} ({country_code})")
+            log.debug(f"Processing {len(config_list)} configs for {country_name} ({country_code})")
             
             # Sort by speed (lowest first) for better organization
-            config_list.sort(key=lambda x: x['speed'], reverse=False)
+            config_list.sort(key=itemgetter(0))
             
-            # Process each config for this country
-            content = ""
-            for config_item in config_list:
-                content += config_item['config'] + "\n"
+            # Combine all configs for this country into one string
+            content = "\n".join(config for _, config in config_list) + "\n"
             
             # Call the build_config function
             config_result = build_config(f"{flag_emoji} {country_name}", content, check=False)
@@ -220,25 +261,21 @@ def fetch_and_process_configs():
                 configs.append(config_result)
         
         # Save to JSON file
-        print(f"\nSaving {len(configs)} configurations to configs.json...")
-        with open('configs.json', 'w', encoding='utf-8') as f:
-            json.dump(configs, f, indent=2, ensure_ascii=False)
+        log.info(f"\nSaving {len(configs)} configurations to configs.json...")
+        write_json('configs.json', configs)
         
-        print("✅ Successfully created configs.json")
-        print(f"Total configurations processed: {len(configs)}")
+        log.info("✅ Successfully created configs.json")
+        log.info(f"Total configurations processed: {len(configs)}")
         
         # Print summary by country
-        country_summary = defaultdict(int)
-        for country_code in country_configs.keys():
-            country_name, _ = get_country_info(country_code)
-            country_summary[country_name] = len(country_configs[country_code])
-        
-        print("\nSummary by country:")
+        log.info("\nSummary by country:")
         for country, count in sorted(country_summary.items()):
-            print(f"  {country}: {count} configs")
+            log.info(f"  {country}: {count} configs")
             
     except Exception as e:
-        print(f"❌ Error processing data: {e}")
+        log.error(f"❌ Error processing data: {e}")
 
 if __name__ == "__main__":
+    # LOGLEVEL=WARNING silences the progress lines; DEBUG adds per-country ones
+    logging.basicConfig(level=os.getenv('LOGLEVEL', 'INFO').upper(), format='%(message)s')
     fetch_and_process_configs()
\ No newline at end of file
@@ -5,28 +5,60 @@ Uses .env file for API_URL and DECRYPT_KEY
 """
 
 import os, sys
+from functools import lru_cache
 import requests
-import base64
+try:
+    # SIMD-accelerated drop-in replacement for the stdlib codec
+    import pybase64 as base64
+except ImportError:
+    import base64
 import json
 from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+try:
+    # Thinner libsodium binding for the same AEAD, used when PyNaCl is installed
+    from nacl.bindings import crypto_aead_chacha20poly1305_ietf_decrypt
+except ImportError:
+    crypto_aead_chacha20poly1305_ietf_decrypt = None
 from dotenv import load_dotenv
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from v2ray2json import generateConfig
+from v2ray2json import generateConfigDict
+from json_utils import loads, write_json
+from template_cache import load_template, proxy_tag
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Reused across requests so repeated fetches skip the TLS handshake
+_SESSION = requests.Session()
+
 def base64_decode_safe(data):
     """Safely decode base64 data with proper padding"""
     # Add padding if needed
-    missing_padding = len(data) % 4
-    if missing_padding:
-        data += '=' * (4 - missing_padding)
-    
-    # Handle URL-safe base64
-    data = data.replace('-', '+').replace('_', '/')
+    data += '=' * (-len(data) % 4)
     
-    return base64.b64decode(data)
+    # Accepts both URL-safe ('-', '_') and standard ('+', '/') alphabets
+    return base64.urlsafe_b64decode(data)
+
+@lru_cache(maxsize=4)
+def _derive_key(key_string):
+    """Turn the configured key into the 32 bytes ChaCha20 expects"""
+    if not isinstance(key_string, str):
+        return key_string
+    # Try different key derivation methods
+    try:
+        # Method 1: Direct base64 decode of key
+        key = base64_decode_safe(key_string)
+        if len(key) != 32:
+            raise ValueError("Key length not 32 bytes")
+        return key
+    except Exception:
+        # Method 2: Use key string directly as bytes and pad/truncate to 32 bytes
+        return key_string.encode('utf-8')[:32].ljust(32, b'\x00')
+
+@lru_cache(maxsize=4)
+def _cipher(key_string):
+    """ChaCha20Poly1305 instance for a key, built once per key"""
+    return ChaCha20Poly1305(_derive_key(key_string))
 
 def decrypt_chacha20(encrypted_data, key_string):
     """
@@ -45,39 +77,19 @@ def decrypt_chacha20(encrypted_data, key_string):
         nonce = base64_decode_safe(encrypted_data['nonce'])
         tag = base64_decode_safe(encrypted_data['tag'])
         
-        # Prepare the key - might need derivation or direct use
-        if isinstance(key_string, str):
-            # Try different key derivation methods
-            try:
-                # Method 1: Direct base64 decode of key
-                key = base64_decode_safe(key_string)
-                if len(key) != 32:
-                    raise ValueError("Key length not 32 bytes")
-            except:
-                # Method 2: Use key string directly as bytes and pad/truncate to 32 bytes
-                key_bytes = key_string.encode('utf-8')
-                if len(key_bytes) < 32:
-                    key = key_bytes + b'\x00' * (32 - len(key_bytes))
-                else:
-                    key = key_bytes[:32]
-        else:
-            key = key_string
-        
         # Ensure nonce is 12 bytes for ChaCha20
-        if len(nonce) != 12:
-            if len(nonce) > 12:
-                nonce = nonce[:12]
-            else:
-                nonce = nonce + b'\x00' * (12 - len(nonce))
+        nonce = nonce[:12].ljust(12, b'\x00')
         
         # Combine ciphertext and tag
         ciphertext_with_tag = ciphertext + tag
         
-        # Initialize ChaCha20Poly1305
-        cipher = ChaCha20Poly1305(key)
-        
         # Decrypt
-        decrypted = cipher.decrypt(nonce, ciphertext_with_tag, None)
+        if crypto_aead_chacha20poly1305_ietf_decrypt is not None:
+            decrypted = crypto_aead_chacha20poly1305_ietf_decrypt(
+                ciphertext_with_tag, None, nonce, _derive_key(key_string)
+            )
+        else:
+            decrypted = _cipher(key_string).decrypt(nonce, ciphertext_with_tag, None)
         
         return decrypted.decode('utf-8')
         
@@ -108,11 +120,11 @@ def fetch_and_decrypt():
         print(f"Fetching data from API...")
         
         # Make request
-        response = requests.get(full_url, timeout=30)
+        response = _SESSION.get(full_url, timeout=30)
         response.raise_for_status()
         
         # Parse JSON response
-        data = response.json()
+        data = loads(response.content)
         
         if not data.get('status', False):
             return "API returned status: false"
@@ -157,46 +169,42 @@ def create_config_with_debug():
     print(f"Can write to parent: {os.access('..', os.W_OK)}")
     
     try:
-        # Read configs
-        with open('configs.txt', 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            print(f"Found {len(lines)} lines in configs.txt")
-            
         proxies = []
         i = 0
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            i += 1
-            
-            try:
-                print(f"Processing line {i}: {line[:50]}...")
-                json_config = generateConfig(line)
-                config = json.loads(json_config)
-                
-                if "outbounds" not in config or len(config["outbounds"]) == 0:
-                    print(f"Warning: No outbounds in config for line {i}")
+        # Read configs one line at a time instead of loading the whole file
+        with open('configs.txt', 'r', encoding='utf-8') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
                     continue
-                    
-                config["outbounds"][0]["tag"] = f"proxy{i}"
-                proxies.append(config["outbounds"][0])
-                print(f"Successfully processed line {i}")
+                i += 1
                 
-            except Exception as e:
-                print(f"Error processing line {i}: {e}")
-                continue
+                try:
+                    print(f"Processing line {i}: {line[:50]}...")
+                    config = generateConfigDict(line)
+                    
+                    if not config or "outbounds" not in config or len(config["outbounds"]) == 0:
+                        print(f"Warning: No outbounds in config for line {i}")
+                        continue
+                        
+                    config["outbounds"][0]["tag"] = proxy_tag(i)
+                    proxies.append(config["outbounds"][0])
+                    print(f"Successfully processed line {i}")
+                    
+                except Exception as e:
+                    print(f"Error processing line {i}: {e}")
+                    continue
         
+        print(f"Found {i} non-empty lines in configs.txt")
         print(f"Total proxies created: {len(proxies)}")
         
         # Load template
-        with open("../template.json", "r") as f:
-            template = json.loads(f.read())
+        template = load_template("../template.json")
         print("Template loaded successfully")
         
         # Modify template
         original_count = len(template.get("outbounds", []))
-        template["outbounds"][:0] = proxies
+        template["outbounds"] = proxies + template["outbounds"]
         new_count = len(template.get("outbounds", []))
         print(f"Template outbounds: {original_count} -> {new_count}")
         
@@ -204,11 +212,10 @@ def create_config_with_debug():
         config_path = os.path.abspath("config.json")
         print(f"Writing to: {config_path}")
         
-        with open("config.json", "w", encoding='utf-8') as f:
-            json.dump(template, f, indent=4, ensure_ascii=False)
+        size = write_json("config.json", template)
         
         print("✓ config.json created successfully!")
-        print(f"File size: {os.path.getsize('config.json')} bytes")
+        print(f"File size: {size} bytes")
         
     except Exception as e:
         print(f"✗ Error: {e}")
@@ -247,11 +254,12 @@ def main():
         
         # Show first few lines if successful
         if not result.startswith('Error'):
-            lines = result.split('\n')[:5]
+            # Bounded split: only scan far enough to know whether there is a 6th line
+            lines = result.split('\n', 5)
             print("\nFirst few lines of decrypted data:")
-            for line in lines:
+            for line in lines[:5]:
                 print(f"  {line}")
-            if len(result.split('\n')) > 5:
+            if len(lines) > 5:
                 print("  ...")
         else:
             print(f"❌ Decryption failed: {result}")
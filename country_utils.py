@@ -12,6 +12,7 @@ import pycountry
 
 # Regional indicator symbol 'A' (U+1F1E6); 'A' is U+0041.
 _FLAG_BASE = 0x1F1E6
+_FLAG_LAST = _FLAG_BASE + 25  # 'Z'
 _ASCII_A = ord("A")
 _FLAG_OFFSET = _FLAG_BASE - _ASCII_A  # 127397
 
@@ -32,17 +33,40 @@ COMMON_CODE_NAMES = {
     "IR": "Iran",
 }
 
+# alpha-2 code -> pycountry name, built once so lookups are a plain dict probe.
+_CODE_TO_NAME = {country.alpha_2: country.name for country in pycountry.countries}
+
+
+def _flag_from_code(code):
+    return "".join(chr(_FLAG_OFFSET + ord(c)) for c in code)
+
+
+# alpha-2 code -> flag emoji for every known country.
+_CODE_TO_FLAG = {code: _flag_from_code(code) for code in _CODE_TO_NAME}
+_KNOWN_FLAGS = frozenset(_CODE_TO_FLAG.values())
+# flag emoji -> pycountry name, so resolving a flag is a single dict probe.
+_FLAG_TO_NAME = {flag: _CODE_TO_NAME[code] for code, flag in _CODE_TO_FLAG.items()}
+
 
 def is_flag_emoji(text):
     """Return True if ``text`` is exactly one flag emoji (two indicator symbols)."""
-    return len(text) == 2 and all(_FLAG_BASE <= ord(c) <= _FLAG_BASE + 25 for c in text)
+    if text in _KNOWN_FLAGS:
+        return True
+    return (
+        len(text) == 2
+        and _FLAG_BASE <= ord(text[0]) <= _FLAG_LAST
+        and _FLAG_BASE <= ord(text[1]) <= _FLAG_LAST
+    )
 
 
 def code_to_flag(country_code):
     """Convert an alpha-2 country code to its flag emoji, or a default flag."""
     code = country_code.upper().strip()
+    flag = _CODE_TO_FLAG.get(code)
+    if flag:
+        return flag
     if len(code) == 2 and code.isalpha():
-        return "".join(chr(_FLAG_OFFSET + ord(c)) for c in code)
+        return _flag_from_code(code)
     return DEFAULT_FLAG
 
 
@@ -63,15 +87,20 @@ def country_name_from_code(country_code, special_cases=None, default=_UNSET):
     code = country_code.upper().strip()
     if special_cases and code in special_cases:
         return special_cases[code]
-    try:
-        country = pycountry.countries.get(alpha_2=code)
-    except Exception:
-        country = None
-    if country:
-        return country.name
+    name = _CODE_TO_NAME.get(code)
+    if name:
+        return name
     return code if default is _UNSET else default
 
 
+def country_info(country_code, special_cases=None):
+    """Return ``(country name, flag emoji)`` for an alpha-2 code."""
+    return (
+        country_name_from_code(country_code, special_cases=special_cases),
+        code_to_flag(country_code),
+    )
+
+
 def country_name_from_flag(flag, special_cases=None, default=_UNSET):
     """Resolve a flag emoji to a country name.
 
@@ -82,6 +111,9 @@ def country_name_from_flag(flag, special_cases=None, default=_UNSET):
     """
     if special_cases and flag in special_cases:
         return special_cases[flag]
+    name = _FLAG_TO_NAME.get(flag)
+    if name:
+        return name
     fallback = flag if default is _UNSET else default
     code = flag_to_code(flag)
     if code is None:
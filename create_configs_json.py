@@ -1,29 +1,63 @@
-from typing import List
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 from v2ray2json import generateConfig
-from xray_checker import get_working_proxies
-import json
-import copy
+from xray_checker import get_working_proxies_from_text
+from json_utils import loads, dumps_bytes
+from template_cache import load_template, proxy_tag, splice_outbounds
+import io
 import os
 import subprocess
 import urllib.parse
-import re
-import base64
-from v2rayng import uri_to_json
+from v2rayng import uri_to_dict, FORMATTERS
 # Import added for concurrency
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import dropwhile
+
+# Below this many lines, starting worker processes costs more than parsing serially.
+PARSE_POOL_MIN_LINES = 256
+
+# URI prefixes uri_to_dict can convert; other lines (comments, junk) are skipped up front.
+URI_PREFIXES = tuple(f"{scheme}://" for scheme in FORMATTERS)
+
+# Proxies checked together in one xray invocation; rejected batches are bisected.
+VALIDATE_BATCH_SIZE = 64
+
+# Outbound protocols and stream networks the pinned Xray build (v25.7.26) can
+# load. Anything else (e.g. the removed quic/domainsocket/h2 transports, or a
+# typo in type=) is rejected by xray anyway, so it is dropped before validation.
+# Networks are compared lowercased, since xray accepts e.g. "WS" as well.
+SUPPORTED_PROTOCOLS = frozenset(
+    {"vless", "vmess", "trojan", "shadowsocks", "socks", "http", "wireguard"}
+)
+SUPPORTED_NETWORKS = frozenset(
+    {"tcp", "raw", "ws", "grpc", "httpupgrade", "xhttp", "splithttp", "kcp", "mkcp"}
+)
+
+@lru_cache(maxsize=4096)
+def _outbound_bytes(line: str) -> Optional[bytes]:
+    """
+    Compact JSON of the outbound for a subscription line, cached because lines
+    repeat across sources. Bytes are immutable, so every caller still parses
+    its own dict from them.
+    """
+    outbound = uri_to_dict(line)
+    if outbound is None:
+        return None
+    return dumps_bytes(outbound, indent=None)
 
-TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "template.json")
-with open(TEMPLATE_PATH, "r") as f:
-    TEMPLATE = json.load(f)
+# Bytes allowed in a UUID; bytes.translate deletes them in a single C pass.
+_UUID_CHARS = b"0123456789abcdefABCDEF-"
+# Every byte except hex digits, for stripping a malformed UUID down to its hex.
+_NON_HEX_BYTES = bytes(b for b in range(256) if b not in b"0123456789abcdefABCDEF")
 
 
 def is_valid_uuid(uuid: str) -> bool:
+    # 8-4-4-4-12 layout: exactly four dashes at fixed offsets, everything else hex.
     return (
-        re.fullmatch(
-            r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}",
-            uuid,
-        )
-        is not None
+        len(uuid) == 36
+        and uuid[8] == uuid[13] == uuid[18] == uuid[23] == "-"
+        and uuid.count("-") == 4
+        and not uuid.encode("utf-8").translate(None, _UUID_CHARS)
     )
 
 
@@ -31,88 +65,141 @@ def fix_uuid(raw_uuid: str) -> str:
     decoded = urllib.parse.unquote(raw_uuid)
     if is_valid_uuid(decoded):
         return decoded
-    hex_chars = re.sub(r"[^a-fA-F0-9]", "", decoded)
+    hex_chars = decoded.encode("utf-8").translate(None, _NON_HEX_BYTES).decode("ascii")
     if len(hex_chars) >= 32:
         return f"{hex_chars[:8]}-{hex_chars[8:12]}-{hex_chars[12:16]}-{hex_chars[16:20]}-{hex_chars[20:32]}"
     return decoded
 
 
-def remove_duplicate_type_param(url: str) -> str:
-    # Remove all type= except the first one
-    type_pattern = re.compile(r"(type=[^&]*)", re.IGNORECASE)
-    matches = type_pattern.findall(url)
-    if len(matches) <= 1:
-        return url
-    first = matches[0]
-    start = url.find(first)
-    rest = url[start + len(first) :]
-    rest_cleaned = type_pattern.sub("", rest)
-    rest_cleaned = re.sub(r"&&+", "&", rest_cleaned)
-    rest_cleaned = re.sub(r"[?&]+$", "", rest_cleaned)
-    rest_cleaned = re.sub(r"[?&]+&", "?", rest_cleaned)
-    return url[: start + len(first)] + rest_cleaned
-
-
-def fix_encryption_param(url: str) -> str:
-    # Fix malformed encryption=none%3D...
-    def replacer(match):
-        return "encryption=none"
-
-    return re.sub(r"encryption=none[^&#]*", replacer, url)
+def clean_vless_query(query: str) -> str:
+    """
+    Keeps only the first type= param (any case), fixes malformed encryption=none%3D...
+    values and drops empty params. Untouched params keep their original encoding.
+    """
+    params = []
+    seen_type = False
+    for param in query.split("&"):
+        if not param:
+            continue
+        key, _, value = param.partition("=")
+        if key.lower() == "type":
+            if seen_type:
+                continue
+            seen_type = True
+        elif key == "encryption" and value != "none":
+            if urllib.parse.unquote(value).startswith("none"):
+                param = "encryption=none"
+        params.append(param)
+    return "&".join(params)
+
+
+def query_needs_cleanup(query: str) -> bool:
+    """
+    Cheap substring checks for anything clean_vless_query would change.
+    False positives only cost a full clean; well-formed queries skip it.
+    """
+    # Counted case-insensitively; headerType= also matches, which is harmless.
+    if query.lower().count("type=") > 1 or "&&" in query:
+        return True
+    if query.startswith("&") or query.endswith("&") or "encryption=%" in query:
+        return True
+    # Every encryption=none must be a whole value, i.e. followed by '&' or the end.
+    whole = query.count("encryption=none&") + query.endswith("encryption=none")
+    return query.count("encryption=none") != whole
 
 
+@lru_cache(maxsize=4096)
 def fix_vless_url(url: str) -> str:
     if not url.startswith("vless://"):
         return url
 
-    body = url[len("vless://") :]
-    if "@" not in body:
+    userinfo, sep, rest = url.removeprefix("vless://").partition("@")
+    if not sep:
         return url
 
-    userinfo, rest = body.split("@", 1)
     fixed_uuid = fix_uuid(userinfo)
     rebuilt = f"vless://{fixed_uuid}@{rest}"
-    rebuilt = remove_duplicate_type_param(rebuilt)
-    rebuilt = fix_encryption_param(rebuilt)
-    return rebuilt
+    # Most URLs have nothing to clean; skip urlsplit and the param walk for them.
+    if not query_needs_cleanup(rest.partition("?")[2].partition("#")[0]):
+        return rebuilt
+    try:
+        parts = urllib.parse.urlsplit(rebuilt)
+    except ValueError:
+        return rebuilt
+    query = clean_vless_query(parts.query)
+    if query == parts.query:
+        return rebuilt
+    return urllib.parse.urlunsplit(parts._replace(query=query))
+
+
+@lru_cache(maxsize=None)
+def xray_supports_test(xray_path: str) -> bool:
+    """
+    Checks once per binary whether 'xray run -test' is available, which only
+    parses the config and exits instead of starting the proxy.
+    """
+    try:
+        result = subprocess.run(
+            [xray_path, "run", "-test", "-c", "stdin:"],
+            input="{}",
+            text=True,
+            capture_output=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0
 
 
-def is_xray_config_valid(
-    config_dict: dict, xray_path: str = os.path.join(os.path.dirname(__file__), "xray")
-) -> bool:
+DEFAULT_XRAY_PATH = os.path.join(os.path.dirname(__file__), "xray")
+
+
+def is_xray_config_valid(config_dict: dict, xray_path: str = DEFAULT_XRAY_PATH) -> bool:
     """
-    Validates an Xray configuration by attempting to run it with a timeout.
-    This is a workaround for older Xray versions that lack the 'test' command.
+    Validates an Xray configuration with 'xray run -test' when supported.
+    Older Xray versions lack that flag, so for them the config is run with a
+    timeout and still running afterwards counts as valid.
     """
     if not config_dict:
         return False
+    # Compact UTF-8 bytes go straight to xray's stdin, with no text-mode encoding pass.
+    return is_xray_json_valid(dumps_bytes(config_dict, indent=None), xray_path)
 
-    config_str = json.dumps(config_dict)
-    command = [xray_path, "run", "-c", "stdin:"]
+
+def is_xray_json_valid(config_bytes: bytes, xray_path: str = DEFAULT_XRAY_PATH) -> bool:
+    """Same as is_xray_config_valid, for a config that is already serialized."""
+    test_mode = xray_supports_test(xray_path)
+    if test_mode:
+        command = [xray_path, "run", "-test", "-c", "stdin:"]
+    else:
+        command = [xray_path, "run", "-c", "stdin:"]
 
     try:
-        # Attempt to run the config with a 2-second timeout.
+        # -test returns within milliseconds; a plain run needs the 2-second timeout.
+        # close_fds=False lets CPython use posix_spawn instead of fork+exec; fds
+        # Python opens are non-inheritable (PEP 446), so the child gets none anyway.
         result = subprocess.run(
             command,
-            input=config_str,
-            text=True,
+            input=config_bytes,
             capture_output=True,
-            timeout=2,  # Add a timeout
+            close_fds=False,
+            timeout=5 if test_mode else 2,
         )
 
         # If the process exited before the timeout, check its return code.
         # A non-zero code means the config was invalid.
         if result.returncode != 0:
-            print(f"Xray validation failed: {result.stderr.strip()}")
+            output = (result.stderr or result.stdout).decode("utf-8", "replace")
+            print(f"Xray validation failed: {output.strip()}")
             return False
 
-        # This case is unlikely for 'run' but we'll treat a clean exit as valid.
+        # A clean exit is the success case for -test (and unlikely for 'run').
         return True
 
     except subprocess.TimeoutExpired:
-        # If it times out, it means Xray started successfully and is running.
-        # This is our success condition for a valid config.
-        return True
+        # Without -test, timing out means Xray started successfully and is running.
+        # With -test, a hang is treated as a failure.
+        return not test_mode
 
     except FileNotFoundError:
         print(f"Warning: '{xray_path}' executable not found. Skipping validation.")
@@ -123,78 +210,204 @@ def is_xray_config_valid(
         return False
 
 
-def build_proxies_from_content(content: str, check: bool = True) -> List[dict]:
+def parse_proxy_line(line: str) -> Tuple[str, Optional[dict]]:
+    """
+    Converts one subscription line into its proxy outbound dict.
+    Returns the (possibly fixed) line and the outbound, or None if parsing failed.
+    Kept at module level so ProcessPoolExecutor can pickle it.
+    """
+    if not line.startswith(URI_PREFIXES):
+        # Schemes are case-insensitive (urlparse lowercases them), so VLESS://
+        # lines are normalized rather than skipped.
+        scheme, sep, rest = line.partition("://")
+        line = f"{scheme.lower()}{sep}{rest}"
+    if not line.startswith(URI_PREFIXES):
+        print(f"Skipping line with unsupported scheme: {line[:50]}")
+        return line, None
+    try:
+        if line.startswith("vless://"):
+            line = fix_vless_url(line)
+        outbound = _outbound_bytes(line)
+        if outbound is None:
+            return line, None
+        return line, loads(outbound)
+    except Exception as e:
+        print(f"Error processing line: {line}\nException: {e}")
+        return line, None
+
+
+def _iter_numbered_lines(content: Union[str, Iterable[str]]) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (line number, stripped line) for each non-blank line of a string or line iterable.
+    Numbering starts at the first non-blank line, without copying the whole string to strip it.
+    """
+    if isinstance(content, str):
+        content = io.StringIO(content)
+    content = dropwhile(lambda line: not line.strip(), content)
+    for i, line in enumerate(content, 1):
+        line = line.strip()
+        if line:
+            yield i, line
+
+
+def is_supported_outbound(outbound: dict) -> bool:
+    """Cheap check that xray knows the outbound's protocol and transport."""
+    if outbound.get("protocol") not in SUPPORTED_PROTOCOLS:
+        return False
+    network = (outbound.get("streamSettings") or {}).get("network") or "tcp"
+    return str(network).lower() in SUPPORTED_NETWORKS
+
+
+def _outbound_server(outbound: dict) -> Optional[dict]:
+    """The first vnext/servers entry of an outbound, or None for protocols without one."""
+    settings = outbound.get("settings") or {}
+    servers = settings.get("vnext") or settings.get("servers")
+    if not servers or not isinstance(servers[0], dict):
+        return None
+    return servers[0]
+
+
+def has_usable_endpoint(outbound: dict) -> bool:
+    """
+    Static sanity check on the server address and port. 'xray run -test' only
+    parses the config, so an empty host or port 0 would otherwise pass validation.
+    """
+    settings = outbound.get("settings") or {}
+    if "vnext" not in settings and "servers" not in settings:
+        # e.g. wireguard peers; nothing cheap to check
+        return True
+    server = _outbound_server(outbound)
+    if server is None:
+        return False
+    address = server.get("address")
+    port = server.get("port")
+    if not isinstance(address, str) or not address.strip() or " " in address:
+        return False
+    return isinstance(port, int) and 0 < port < 65536
+
+
+def validate_batch(tasks: List[dict]) -> List[dict]:
+    """
+    Validates the proxies of several tasks with a single xray call by splicing
+    them into the template. If xray rejects it, the batch is split in half until
+    the invalid proxies are isolated. Returns the tasks whose proxies are valid.
+    """
+    if is_xray_json_valid(splice_outbounds([task["json"] for task in tasks])):
+        return tasks
+    if len(tasks) == 1:
+        return []
+    mid = len(tasks) // 2
+    return validate_batch(tasks[:mid]) + validate_batch(tasks[mid:])
+
+
+def build_proxies_from_content(
+    content: Union[str, Iterable[str]], check: bool = True
+) -> List[dict]:
     """
     Parses content, validates each generated config CONCURRENTLY, and returns valid proxies.
+    `content` may be a string or any iterable of lines, such as an open file.
     """
     tasks_to_process = []
     # print("",base64.b64encode(content.encode('utf-8')).decode('utf-8'),"")
     if check:
-        content = get_working_proxies(
-            base64.b64encode(content.encode("utf-8")).decode("utf-8")
-        )
+        if not isinstance(content, str):
+            content = "\n".join(line.strip() for line in content)
+        content = get_working_proxies_from_text(content)
     if not content:
         return None
     # 1. First, parse all lines and generate configs without validating yet.
-    for i, line in enumerate(content.strip().splitlines()):
-        line = line.strip()
-        if not line:
+    # Aggregated feeds repeat lines verbatim, so each distinct line is parsed
+    # once; every input line still yields its own entry, as before.
+    numbered_lines = list(_iter_numbered_lines(content))
+    lines = list(dict.fromkeys(line for _, line in numbered_lines))
+    # Parsing is CPU-bound pure Python, so large inputs are spread over processes.
+    if len(lines) >= PARSE_POOL_MIN_LINES:
+        workers = os.cpu_count() or 1
+        # About four chunks per worker (multiprocessing.Pool's heuristic): few
+        # pickling round-trips, yet still balanced when some lines parse slower.
+        chunksize = max(16, len(lines) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(parse_proxy_line, lines, chunksize=chunksize))
+    else:
+        parsed = map(parse_proxy_line, lines)
+    parsed_by_line = dict(zip(lines, parsed))
+
+    emitted_lines = set()
+    for index, raw_line in numbered_lines:
+        line, p = parsed_by_line[raw_line]
+        if p is None:
             continue
-        try:
-            if "vless" in line:
-                line = fix_vless_url(line)
-            p = json.loads(uri_to_json(line))
-            config = build_config_json_from_proxy("a", p)
-            print("kirrrr",config)
-            # Store the config and its original metadata (line, index) for later.
-            tasks_to_process.append({"config": config, "line": line, "index": i + 1})
-        except Exception as e:
-            print(f"Error processing line: {line}\nException: {e}")
+        if raw_line in emitted_lines:
+            # Repeats get their own dict, since each one is tagged separately
+            p = loads(dumps_bytes(p, indent=None))
+        emitted_lines.add(raw_line)
+        if not is_supported_outbound(p):
+            print(f"Skipping unsupported protocol/transport from line: {line}")
             continue
+        if not has_usable_endpoint(p):
+            print(f"Skipping config without a usable address/port from line: {line}")
+            continue
+        # Store the proxy and its original metadata (line, index) for later.
+        tasks_to_process.append({"proxy": p, "line": line, "index": index})
 
-    proxies = []
     # Use a reasonable number of worker threads. Capped at 32.
     max_workers = min(32, (os.cpu_count() or 1) * 5)
 
-    # 2. Concurrently validate all the generated configs.
+    # Lines that differ only in their remarks yield identical outbounds. Each
+    # distinct definition (keyed by its JSON before tagging) is validated once
+    # and the verdict applies to every line that produced it.
+    unique_tasks = {}
+    for task in tasks_to_process:
+        task["key"] = dumps_bytes(task["proxy"], indent=None)
+        unique_tasks.setdefault(task["key"], task)
+    unique_tasks = list(unique_tasks.values())
+
+    # Tags must be unique before proxies can share a config in validate_batch.
+    # Each proxy is serialized once here; bisection only re-joins the bytes.
+    for task in tasks_to_process:
+        task["proxy"]["tag"] = proxy_tag(task["index"])
+    for task in unique_tasks:
+        task["json"] = dumps_bytes(task["proxy"], indent=None)
+
+    # 2. Concurrently validate the distinct configs, one xray run per batch.
+    valid_keys = set()
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Map each future object back to its original task data.
-        future_to_task = {
-            executor.submit(is_xray_config_valid, task["config"]): task
-            for task in tasks_to_process
-        }
+        # Map each future object back to its batch.
+        future_to_batch = {}
+        for offset in range(0, len(unique_tasks), VALIDATE_BATCH_SIZE):
+            batch = unique_tasks[offset : offset + VALIDATE_BATCH_SIZE]
+            future_to_batch[executor.submit(validate_batch, batch)] = batch
 
         # Process results as they are completed.
-        for future in as_completed(future_to_task):
-            task = future_to_task[future]
+        for future in as_completed(future_to_batch):
+            batch = future_to_batch[future]
             try:
-                is_valid = future.result()
-                if is_valid:
-                    proxy = task["config"]["outbounds"][0]
-                    proxy["tag"] = f"proxy{task['index']}"
-                    proxies.append(proxy)
-                else:
+                valid_tasks = future.result()
+            except Exception as e:
+                print(f"An exception occurred while validating lines {batch[0]['index']}-{batch[-1]['index']}: {e}")
+                continue
+            valid_keys.update(task["key"] for task in valid_tasks)
+            for task in batch:
+                if task["key"] not in valid_keys:
                     print(
-                        f"Skipping invalid config from line: {task['line']} \n {json.dumps(task['config'])}"
+                        f"Skipping invalid config from line: {task['line']} \n {task['json'].decode('utf-8')}"
                     )
-            except Exception as e:
-                print(f"An exception occurred for config from line {task['line']}: {e}")
-
-    # 3. Sort proxies by their original index to maintain order.
-    proxies.sort(key=lambda p: int(p["tag"].replace("proxy", "")))
 
+    # 3. Keep every line whose definition validated, in the original line order.
+    proxies = [task["proxy"] for task in tasks_to_process if task["key"] in valid_keys]
+    print(f"✅ {len(proxies)}/{len(tasks_to_process)} configs passed validation")
     return proxies
 
 def build_config_json_from_proxy(name: str, proxy: dict) -> dict:
-    template = copy.deepcopy(TEMPLATE)
+    template = load_template()
     template["remarks"] = name
-    template["outbounds"].insert(0, proxy)
+    template["outbounds"] = [proxy, *template["outbounds"]]
     return template
 
 def build_config_json_from_proxies(name: str, proxies: list) -> dict:
-    template = copy.deepcopy(TEMPLATE)
+    template = load_template()
     template["remarks"] = name
-    template["outbounds"][:0] = proxies
+    template["outbounds"] = proxies + template["outbounds"]
     return template
 
 
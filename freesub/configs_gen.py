@@ -2,13 +2,14 @@ import json
 import requests
 import re
 import random
-import copy
 import os
 import sys
 from dotenv import load_dotenv
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from country_utils import is_flag_emoji, country_name_from_flag
+from json_utils import loads, dumps_bytes, write_json
+from template_cache import load_template, proxy_tag
 
 # 1. Load Environment Variables
 load_dotenv()
@@ -23,6 +24,9 @@ IPS = [
     "104.26.14.85",
 ]
 
+# Two regional indicator symbols form one flag emoji.
+FLAG_RE = re.compile(r"[\U0001F1E6-\U0001F1FF]{2}")
+
 
 def starts_with_flag(text):
     """
@@ -39,7 +43,7 @@ def replace_flag_with_country(text):
         return text
 
     # Find all flags in the string
-    flags = re.findall(r"[\U0001F1E6-\U0001F1FF]{2}", text)
+    flags = FLAG_RE.findall(text)
 
     # Use set to avoid duplicates
     for flag in set(flags):
@@ -58,10 +62,9 @@ def main():
         print("Error: TARGET_URL not found in .env file.")
         return
 
-    # Load Template
+    # Load Template (cached; each config below parses its own copy)
     try:
-        with open(TEMPLATE_FILE, "r", encoding="utf-8") as f:
-            template = json.load(f)
+        load_template(TEMPLATE_FILE)
     except FileNotFoundError:
         print(f"Error: {TEMPLATE_FILE} not found.")
         return
@@ -76,10 +79,13 @@ def main():
         print(f"Fetching data from target URL...")
         response = requests.get(TARGET_URL, headers=headers)
         response.raise_for_status()
-        data = response.json()
+        data = loads(response.content)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching JSON: {e}")
         return
+    except ValueError as e:
+        print(f"Error parsing JSON: {e}")
+        return
 
     final_data = []
 
@@ -147,8 +153,8 @@ def main():
                 }
         except (KeyError, IndexError, TypeError):
             pass
-        # Deep clone template
-        tmp = copy.deepcopy(template)
+        # Fresh template copy, parsed from the cached serialized template
+        tmp = load_template(TEMPLATE_FILE)
 
         # Update remarks
         tmp["remarks"] = replace_flag_with_country(remarks)
@@ -156,9 +162,11 @@ def main():
         # Add original proxy
         #tmp["outbounds"].insert(0, proxy)
 
-        # Generate variations for IPs
+        # Generate variations for IPs; serialize the proxy once and parse a copy per IP
+        proxy_bytes = dumps_bytes(proxy, indent=None)
+        variations = []
         for j, ip in enumerate(IPS):
-            px = copy.deepcopy(proxy)
+            px = loads(proxy_bytes)
 
             try:
                 original_string = px["streamSettings"]["xhttpSettings"]["host"]
@@ -224,8 +232,11 @@ def main():
             except (KeyError, IndexError):
                 pass
 
-            px["tag"] = f"proxy{j}"
-            tmp["outbounds"].insert(0, px)
+            px["tag"] = proxy_tag(j)
+            variations.append(px)
+
+        # Last IP first, matching the previous insert-at-front order
+        tmp["outbounds"] = variations[::-1] + tmp["outbounds"]
 
         final_data.append(tmp)
 
@@ -233,16 +244,17 @@ def main():
     # Merge Logic: Combine configs with same remarks & reorder tags
     # ---------------------------------------------------------
     merged_configs = {}
+    # Proxies of later duplicates per remark, joined once after the loop
+    merged_proxies = {}
 
     for config in final_data:
         rem = config.get("remarks", "")
 
         if rem not in merged_configs:
             merged_configs[rem] = config
+            merged_proxies[rem] = []
         else:
             # Found a duplicate remark; merge proxies into the existing entry
-            target_config = merged_configs[rem]
-
             # Extract proxies from the current config to merge
             # Filtering for tags starting with 'proxy' ensures we don't duplicate static outbounds (like direct/block)
             source_proxies = [
@@ -251,19 +263,23 @@ def main():
                 if out.get("tag", "").startswith("proxy")
             ]
 
-            # Insert new proxies at the beginning of the target's outbound list
-            for px in reversed(source_proxies):
-                target_config["outbounds"].insert(0, px)
+            merged_proxies[rem].append(source_proxies)
 
     # Reconstruct final_data with reordered tags
     final_data_merged = []
 
     for rem, config in merged_configs.items():
+        # Newest duplicate's proxies first, as when each one was prepended in turn
+        outbounds = [
+            out
+            for source_proxies in reversed(merged_proxies[rem])
+            for out in source_proxies
+        ] + config["outbounds"]
         proxies = []
         others = []
 
         # Separate proxies from static outbounds
-        for out in config["outbounds"]:
+        for out in outbounds:
             if out.get("tag", "").startswith("proxy"):
                 proxies.append(out)
             else:
@@ -274,7 +290,7 @@ def main():
             if i == 0:
                 px["tag"] = "proxy"
             else:
-                px["tag"] = f"proxy{i}"
+                px["tag"] = proxy_tag(i)
 
         # Combine back: proxies first, then others
         config["outbounds"] = proxies + others
@@ -286,8 +302,7 @@ def main():
 
     # Save to config.json
     try:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            json.dump(final_data, f, indent=2, ensure_ascii=False)
+        write_json(OUTPUT_FILE, final_data)
         print(f"Successfully saved {len(final_data)} configurations to {OUTPUT_FILE}")
     except IOError as e:
         print(f"Error saving file: {e}")
@@ -1,12 +1,12 @@
 import re
-import json
 from collections import defaultdict
 import sys
 import os
 
 # Add parent directory to path to import create_configs_json
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-from country_utils import country_name_from_code, code_to_flag, COMMON_CODE_NAMES
+from country_utils import country_info, COMMON_CODE_NAMES
+from json_utils import write_json
 try:
     from create_configs_json import build_config
 except ImportError:
@@ -16,10 +16,7 @@ except ImportError:
 
 def get_country_info(country_code):
     """Get country name and flag emoji from a country code."""
-    return (
-        country_name_from_code(country_code, special_cases=COMMON_CODE_NAMES),
-        code_to_flag(country_code),
-    )
+    return country_info(country_code, special_cases=COMMON_CODE_NAMES)
 
 def parse_config_line(line):
     """
@@ -94,8 +91,7 @@ def process_local_configs():
         # Save to JSON file
         output_file = 'configs.json'
         print(f"\nSaving {len(configs_json_output)} country groups to {output_file}...")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(configs_json_output, f, indent=2, ensure_ascii=False)
+        write_json(output_file, configs_json_output)
         
         print(f"✅ Successfully created {output_file}")
         
@@ -0,0 +1,55 @@
+"""Shared JSON helpers for the config generators.
+
+The generated ``configs.json`` files can be several MB, so they are serialized
+with ``orjson`` when it is installed (a C extension that writes UTF-8 bytes
+directly) and with the stdlib ``json`` module otherwise. Either way the output
+is UTF-8 with non-ASCII characters (flag emojis) left unescaped.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Parse JSON from ``str`` or ``bytes``."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_bytes(data, indent=2, sort_keys=False, default=None):
+    """Serialize ``data`` to UTF-8 JSON bytes (compact when ``indent`` is None).
+
+    ``default`` converts objects the encoder does not support, as in
+    ``json.dumps``. ``orjson`` only supports two-space indentation, so any
+    other ``indent`` goes through the stdlib encoder.
+    """
+    if orjson is not None and indent in (None, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent == 2:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=default, option=option)
+    return json.dumps(
+        data, indent=indent, sort_keys=sort_keys, default=default, ensure_ascii=False
+    ).encode("utf-8")
+
+
+def write_json(path, data, indent=2):
+    """Write ``data`` to ``path`` as JSON and return the number of bytes written.
+
+    The file is written to a temporary sibling and moved into place, so readers
+    never see a half-written file.
+    """
+    payload = dumps_bytes(data, indent=indent)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
@@ -11,11 +11,12 @@ Each source folder (see ``SOURCE_FOLDERS``) produces a list of "config" objects
 """
 
 import json
-import copy
 from pathlib import Path
 from collections import defaultdict
 
 from create_configs_json import build_config_json_from_proxies
+from json_utils import loads, dumps_bytes, write_json
+from template_cache import proxy_tag
 
 SOURCE_FOLDERS = ["freesub", "ala"]
 CANDIDATE_FILES = ["configs.json", "config.json"]
@@ -88,8 +89,8 @@ def load_source(folder):
         if path.exists():
             print(f"Loading: {path}")
             try:
-                with open(path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                with open(path, "rb") as f:
+                    return loads(f.read())
             except json.JSONDecodeError as e:
                 print(f"Invalid JSON in {path}: {e}")
                 return None
@@ -130,7 +131,8 @@ def merge_by_remarks(configs):
             continue
 
         print(f"Merging {len(group)} configs with remarks: {remarks}")
-        base = copy.deepcopy(group[0])
+        # Shallow copies are enough: only top-level keys ("outbounds", "tag") change.
+        base = dict(group[0])
 
         # Split the base config's outbounds, then add every other config's proxies.
         proxies = []
@@ -141,9 +143,9 @@ def merge_by_remarks(configs):
             proxies.extend(ob for ob in config.get("outbounds", []) if is_proxy(ob))
 
         # Renumber the collected proxies (as copies) to avoid tag collisions.
-        proxies = [copy.deepcopy(p) for p in proxies]
+        proxies = [dict(p) for p in proxies]
         for i, proxy in enumerate(proxies, 1):
-            proxy["tag"] = f"proxy{i}"
+            proxy["tag"] = proxy_tag(i)
 
         # Keep the original "proxy" first, then the renumbered set, then statics.
         original_proxy = next(
@@ -171,7 +173,7 @@ def collect_all_proxies(configs):
 
 
 def dedupe_proxies(outbounds):
-    """Return unique proxy outbounds as tagless copies, preserving order.
+    """Return unique proxy outbounds as tagless (shallow) copies, preserving order.
 
     Proxies are compared by their definition (ignoring the ``tag``, which we
     assign ourselves), since the per-source fan-out produces many exact dupes.
@@ -181,9 +183,9 @@ def dedupe_proxies(outbounds):
     for outbound in outbounds:
         if not is_proxy(outbound):
             continue
-        proxy = copy.deepcopy(outbound)
+        proxy = dict(outbound)
         proxy.pop("tag", None)
-        fingerprint = json.dumps(proxy, sort_keys=True, ensure_ascii=False)
+        fingerprint = dumps_bytes(proxy, indent=None, sort_keys=True)
         if fingerprint in seen:
             continue
         seen.add(fingerprint)
@@ -199,7 +201,7 @@ def cap_and_number(proxies):
     """
     proxies = proxies[:MAX_PROXIES_PER_CONFIG]
     for i, proxy in enumerate(proxies, 1):
-        proxy["tag"] = f"proxy{i}"
+        proxy["tag"] = proxy_tag(i)
     return proxies
 
 
@@ -214,11 +216,6 @@ def cap_config_proxies(config):
     return config
 
 
-def write_json(path, data):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
 def main():
     configs = load_all_sources(SOURCE_FOLDERS)
     configs = merge_by_remarks(configs)
@@ -1,17 +1,21 @@
 import requests
 import json
 from collections import defaultdict
-import copy
 import os
 import sys
 from dotenv import load_dotenv
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from country_utils import is_flag_emoji, country_name_from_flag
+from json_utils import loads, write_json
+from template_cache import load_template, proxy_tag
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Shared session so retries and follow-up requests reuse the TLS connection.
+_SESSION = requests.Session()
+
 # Markers that are not flag emojis but appear in remarks.
 SPECIAL_CASES = {
     "(nm_zorp)": "Zorp",
@@ -25,9 +29,6 @@ def emoji_to_country_name(emoji):
     """Convert a flag emoji (or known marker) to a country name."""
     return country_name_from_flag(emoji, special_cases=SPECIAL_CASES)
 
-with open("../template.json", "r") as f:
-  TEMPLATE = json.loads(f.read())
-
 
 def fetch_and_group_data():
     """
@@ -44,12 +45,12 @@ def fetch_and_group_data():
 
     try:
         # Send a GET request to the URL with the specified headers
-        response = requests.get(url, headers=headers)
+        response = _SESSION.get(url, headers=headers)
         # Raise an exception for bad status codes (4xx or 5xx)
         response.raise_for_status()
 
         # Parse the JSON response
-        data = response.json()
+        data = loads(response.content)
 
         # A dictionary to hold the grouped results. defaultdict makes it easier
         # as we don't need to check if the key exists before appending.
@@ -61,18 +62,10 @@ def fetch_and_group_data():
             remarks = item.get("remarks", "")
 
             # The flag emoji is usually the first part of the remarks string.
-            # We split the string by space and take the first element as the key.
-            if remarks:
-                key = remarks.split()[0]
-                # Check if the key is a flag emoji
-                if is_flag_emoji(key):
-                    grouped_data[key].append(item)
-                else:
-                    # If not a flag emoji, group under 'no_remarks'
-                    grouped_data["no_remarks"].append(item)
-            else:
-                # If there are no remarks, group them under a 'no_remarks' key
-                grouped_data["no_remarks"].append(item)
+            # Only the first whitespace-separated token is needed, so split once.
+            key = remarks.split(None, 1)[0] if remarks and not remarks.isspace() else ""
+            # Group flag emojis by flag; anything else (or no remarks) under 'no_remarks'
+            grouped_data[key if is_flag_emoji(key) else "no_remarks"].append(item)
 
         # Pretty-print the grouped JSON data.
         # ensure_ascii=False is used to correctly print the emoji characters.
@@ -102,26 +95,30 @@ def add_to_template(grouped_data):
     # Iterate over the grouped data properly
     for emoji, config_list in grouped_data.items():
         # Parse the template JSON for each country
-        template = copy.deepcopy(TEMPLATE)
+        template = load_template("../template.json")
         
-        # Keep the original proxy outbound at the first position
-        # Find all non-proxy outbounds (after the first proxy)
-        base_outbounds = [ob for ob in template["outbounds"] if ob["tag"] != "proxy"]
+        # Split the template outbounds in one pass: the original "proxy" stays
+        # first, all non-proxy outbounds go after the added proxies
+        original_proxy = None
+        base_outbounds = []
+        for ob in template["outbounds"]:
+            if ob["tag"] != "proxy":
+                base_outbounds.append(ob)
+            elif original_proxy is None:
+                original_proxy = ob
         
-        # Start with just the base outbounds, we'll insert proxies at the beginning
         new_outbounds = []
         
         # Add the original proxy first (keep it as "proxy")
-        original_proxy = next((ob for ob in template["outbounds"] if ob["tag"] == "proxy"), None)
         if original_proxy:
             new_outbounds.append(original_proxy)
         
         # Add each config from this country group
         for i, config in enumerate(config_list, 1):
-            # Create a deep copy of the config's outbound to avoid modifying the original
+            # Only the top-level tag is rewritten, so a shallow copy leaves the original intact
             if "outbounds" in config and len(config["outbounds"]) > 0:
-                proxy_config = copy.deepcopy(config["outbounds"][0])
-                proxy_config["tag"] = f"proxy{i}"
+                proxy_config = config["outbounds"][0].copy()
+                proxy_config["tag"] = proxy_tag(i)
                 new_outbounds.append(proxy_config)
         
         # Add the base outbounds after all proxies
@@ -147,8 +144,7 @@ if __name__ == "__main__":
         configs = configs[1:]
         # Export to configs.json file
         try:
-            with open("configs.json", "w", encoding="utf-8") as f:
-                json.dump(configs, f, indent=4, ensure_ascii=False)
+            write_json("configs.json", configs)
             print(f"Successfully exported {len(configs)} configurations to configs.json")
         except IOError as e:
             print(f"Failed to write configs.json: {e}")
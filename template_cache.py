@@ -0,0 +1,66 @@
+"""Process-wide cache for the shared ``template.json``.
+
+The template is read and parsed once per path; callers get a fresh, independent
+copy by parsing the cached compact bytes, which is much cheaper than
+``copy.deepcopy`` on the nested outbound dicts.
+"""
+
+import os
+import sys
+from functools import lru_cache
+
+from json_utils import loads, dumps_bytes
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template.json")
+
+# Interned "proxy0", "proxy1", ... outbound tags, shared by every generated config.
+_PROXY_TAGS = [sys.intern(f"proxy{i}") for i in range(2048)]
+
+
+@lru_cache(maxsize=4)
+def _read_template_bytes(abs_path):
+    with open(abs_path, "rb") as f:
+        return dumps_bytes(loads(f.read()), indent=None)
+
+
+def get_template_bytes(path=TEMPLATE_PATH):
+    """Return the template at ``path`` as compact JSON bytes (cached)."""
+    return _read_template_bytes(os.path.abspath(path))
+
+
+def load_template(path=TEMPLATE_PATH):
+    """Return a new, mutable copy of the template at ``path``."""
+    return loads(get_template_bytes(path))
+
+
+# Placeholder outbound used to find where proxies go in the serialized template.
+_OUTBOUNDS_MARKER = "__template_cache_outbounds__"
+
+
+@lru_cache(maxsize=4)
+def _split_template_bytes(abs_path):
+    template = loads(_read_template_bytes(abs_path))
+    template["outbounds"] = [_OUTBOUNDS_MARKER, *template.get("outbounds", [])]
+    head, _, tail = dumps_bytes(template, indent=None).partition(
+        dumps_bytes(_OUTBOUNDS_MARKER, indent=None)
+    )
+    return head, tail
+
+
+def splice_outbounds(outbounds_json, path=TEMPLATE_PATH):
+    """Return the template at ``path`` as compact JSON bytes with the given
+    already-serialized outbounds placed before the template's own outbounds.
+
+    Only the new outbounds need serializing; the rest of the template is
+    reused from a cached head/tail split. ``outbounds_json`` must not be empty.
+    """
+    head, tail = _split_template_bytes(os.path.abspath(path))
+    # ``tail`` starts with the separator before the template's outbounds (or "]").
+    return head + b",".join(outbounds_json) + tail
+
+
+def proxy_tag(i):
+    """Return the outbound tag ``proxy{i}``, reusing one string per index."""
+    if 0 <= i < len(_PROXY_TAGS):
+        return _PROXY_TAGS[i]
+    return f"proxy{i}"
@@ -0,0 +1,98 @@
+import os
+import socket
+import sys
+import tempfile
+import textwrap
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import xray_checker
+
+PROXY_URL = "vless://11111111-2222-3333-4444-555555555555@h:443?type=tcp#n"
+
+# Stand-in for the xray-checker binary: fails like Go's listener when the port
+# is taken, otherwise serves /health and metrics reporting PROXY_URL as working.
+FAKE_CHECKER = textwrap.dedent(
+    """
+    import sys
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    port = int(sys.argv[1].split("=", 1)[1])
+    metrics = "# filler\\n" * 8 + (
+        'xray_proxy_status{address="h:443",name="n",protocol="vless"} 1\\n'
+    )
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"OK" if self.path == "/health" else metrics.encode())
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = HTTPServer(("localhost", port), Handler)
+    except OSError:
+        print(f"listen tcp 127.0.0.1:{port}: bind: address already in use")
+        sys.exit(1)
+    server.serve_forever()
+    """
+)
+
+
+class _AlwaysOK(BaseHTTPRequestHandler):
+    """Unrelated service that answers 200 to everything, with no metrics."""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _unused_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+class CheckSubscriptionPortRaceTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.binary = tempfile.mkstemp(suffix=".py")
+        with os.fdopen(handle, "w") as f:
+            f.write(f"#!{sys.executable}\n{FAKE_CHECKER}")
+        os.chmod(self.binary, 0o755)
+        self.addCleanup(os.unlink, self.binary)
+
+        # Another process that grabbed the port after _find_free_port released it
+        self.squatter = HTTPServer(("localhost", 0), _AlwaysOK)
+        threading.Thread(target=self.squatter.serve_forever, daemon=True).start()
+        self.addCleanup(self.squatter.server_close)
+        self.addCleanup(self.squatter.shutdown)
+
+    def test_retries_when_another_listener_holds_the_port(self):
+        taken_port = self.squatter.server_address[1]
+        free_port = _unused_port()
+        with mock.patch.object(
+            xray_checker, "_find_free_port", side_effect=[taken_port, free_port]
+        ) as find_free_port:
+            working = xray_checker._check_xray_subscription(
+                "",
+                1,
+                binary_path=self.binary,
+                timeout=5,
+                check_interval=1,
+                proxy_urls=[PROXY_URL],
+            )
+
+        self.assertEqual(find_free_port.call_count, 2)
+        self.assertEqual(working, [PROXY_URL])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,8 @@ from urllib.parse import urlparse
 from urllib.parse import parse_qs
 from urllib.parse import unquote
 
+from json_utils import loads, dumps_bytes
+
 DEFAULT_PORT = 443
 DEFAULT_SECURITY = "none"
 DEFAULT_LEVEL = 8
@@ -15,6 +17,9 @@ TLS = "tls"
 REALITY = "reality"
 HTTP = "http"
 
+# Legacy shadowsocks form method:password@host:port, compiled once.
+SS_LEGACY_RE = re.compile(r"^(.+?):(.*)@(.+):(\d+)\/?.*$")
+
 
 class EConfigType:
     class VMESS:
@@ -1123,7 +1128,7 @@ def get_routing():
     return routing
 
 
-def generateConfig(config: str, dns_list=["8.8.8.8"]):
+def generateConfigDict(config: str, dns_list=["8.8.8.8"]):
     allowInsecure = True
 
     temp = config.split("://")
@@ -1202,12 +1207,12 @@ def generateConfig(config: str, dns_list=["8.8.8.8"]):
             routing=get_routing(),
         )
 
-        v2rayConfig_str_json = json.dumps(v2rayConfig, default=vars)
+        v2rayConfig_str_json = dumps_bytes(v2rayConfig, indent=None, default=vars)
 
-        res = json.loads(v2rayConfig_str_json)
+        res = loads(v2rayConfig_str_json)
         res = remove_nulls(res)
 
-        return json.dumps(res)
+        return res
 
     elif protocol == EConfigType.VLESS.protocolName:
         parsed_url = urlparse(config)
@@ -1274,12 +1279,12 @@ def generateConfig(config: str, dns_list=["8.8.8.8"]):
             routing=get_routing(),
         )
 
-        v2rayConfig_str_json = json.dumps(v2rayConfig, default=vars)
+        v2rayConfig_str_json = dumps_bytes(v2rayConfig, indent=None, default=vars)
 
-        res = json.loads(v2rayConfig_str_json)
+        res = loads(v2rayConfig_str_json)
         res = remove_nulls(res)
 
-        return json.dumps(res)
+        return res
 
     elif protocol == EConfigType.TROJAN.protocolName:
         parsed_url = urlparse(config)
@@ -1361,12 +1366,12 @@ def generateConfig(config: str, dns_list=["8.8.8.8"]):
             routing=get_routing(),
         )
 
-        v2rayConfig_str_json = json.dumps(v2rayConfig, default=vars)
+        v2rayConfig_str_json = dumps_bytes(v2rayConfig, indent=None, default=vars)
 
-        res = json.loads(v2rayConfig_str_json)
+        res = loads(v2rayConfig_str_json)
         res = remove_nulls(res)
 
-        return json.dumps(res)
+        return res
 
     elif protocol == EConfigType.SHADOWSOCKS.protocolName:
         outbound = get_outbound_ss()
@@ -1392,8 +1397,7 @@ def generateConfig(config: str, dns_list=["8.8.8.8"]):
                 else base64.b64decode(result).decode(encoding="utf-8", errors="ignore")
             )
 
-            legacy_pattern = re.compile(r"^(.+?):(.*)@(.+):(\d+)\/?.*$")
-            match = legacy_pattern.match(result)
+            match = SS_LEGACY_RE.match(result)
 
             if not match:
                 raise Exception("Incorrect protocol")
@@ -1413,12 +1417,19 @@ def generateConfig(config: str, dns_list=["8.8.8.8"]):
                 routing=get_routing(),
             )
 
-            v2rayConfig_str_json = json.dumps(v2rayConfig, default=vars)
+            v2rayConfig_str_json = dumps_bytes(v2rayConfig, indent=None, default=vars)
 
-        res = json.loads(v2rayConfig_str_json)
+        res = loads(v2rayConfig_str_json)
         res = remove_nulls(res)
 
-        return json.dumps(res)
+        return res
+
+
+def generateConfig(config: str, dns_list=["8.8.8.8"]):
+    res = generateConfigDict(config, dns_list=dns_list)
+    if res is None:
+        return None
+    return json.dumps(res)
 
 
 if __name__ == "__main__":
@@ -438,9 +438,27 @@ FORMATTERS = {
     "socks": SocksFmt,
 }
 
-def uri_to_json(uri_string: str) -> Optional[str]:
+def _dataclass_to_dict(obj):
+    """Recursively convert dataclasses to dicts, filtering out None values and empty fields."""
+    if hasattr(obj, '__dict__'):
+        result = {}
+        for k, v in obj.__dict__.items():
+            if v is not None:
+                # Handle dataclass fields with default factories
+                if isinstance(v, list) and not v:
+                    continue
+                if hasattr(v, '__dict__') and not any(v.__dict__.values()):
+                    continue
+                result[k] = _dataclass_to_dict(v)
+        return result
+    elif isinstance(obj, list):
+        return [_dataclass_to_dict(i) for i in obj]
+    else:
+        return obj
+
+def uri_to_dict(uri_string: str) -> Optional[dict]:
     """
-    Converts a V2Ray URI to a pretty-printed JSON outbound configuration.
+    Converts a V2Ray URI to an outbound configuration dict.
     """
     try:
         scheme = urlparse(uri_string).scheme
@@ -458,32 +476,22 @@ def uri_to_json(uri_string: str) -> Optional[str]:
         if not outbound_config:
             print("Failed to convert profile to outbound config.")
             return None
-            
-        # Recursive function to convert dataclasses to dicts, filtering out None values
-        def dataclass_to_dict(obj):
-            if hasattr(obj, '__dict__'):
-                result = {}
-                for k, v in obj.__dict__.items():
-                    if v is not None:
-                        # Handle dataclass fields with default factories
-                        if isinstance(v, list) and not v:
-                            continue
-                        if hasattr(v, '__dict__') and not any(v.__dict__.values()):
-                            continue
-                        result[k] = dataclass_to_dict(v)
-                return result
-            elif isinstance(obj, list):
-                return [dataclass_to_dict(i) for i in obj]
-            else:
-                return obj
-
-        config_dict = dataclass_to_dict(outbound_config)
-        return json.dumps(config_dict, indent=2)
+
+        return _dataclass_to_dict(outbound_config)
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
 
+def uri_to_json(uri_string: str) -> Optional[str]:
+    """
+    Converts a V2Ray URI to a pretty-printed JSON outbound configuration.
+    """
+    config_dict = uri_to_dict(uri_string)
+    if config_dict is None:
+        return None
+    return json.dumps(config_dict, indent=2)
+
 if __name__ == '__main__':
     test_uris = {
         "VLESS": "vless://a1b2c3d4-e5f6-g7h8-i9j0-k1l2m3n4o5p6@example.com:443?encryption=none&security=tls&sni=example.com&type=ws&host=example.com&path=%2Fpath#My-VLESS-Config",
@@ -6,16 +6,51 @@ import re
 import os
 import signal
 import socket
-import base64
+import tempfile
+import threading
+try:
+    # SIMD-accelerated drop-in replacement for the stdlib codec
+    import pybase64 as base64
+except ImportError:
+    import base64
 from typing import List, Dict, Optional
 import logging
 from urllib.parse import unquote, urlparse
 import ipaddress
 import re
 
+# Upper bound on how long xray-checker may take to open its metrics port.
+STARTUP_WAIT = 15
+
+# Ports already handed out in this process. A bind test alone cannot see them,
+# because the binary only binds after _find_free_port has closed its socket.
+_claimed_ports = set()
+_claimed_ports_lock = threading.Lock()
+
+# Connect timeouts for the loopback metrics endpoints. A live local listener
+# accepts well under a second, so only a refused connection (still starting)
+# escalates to the next tier.
+CONNECT_TIMEOUTS = (0.8, 1.5, 3.0)
+
+# Launch attempts when xray-checker loses its metrics port to another process.
+PORT_ATTEMPTS = 3
+# How long xray-checker must stay alive after /health first answers before the
+# listener is trusted to be ours; a lost bind makes the binary exit well within it.
+BIND_GRACE = 1.0
+
+# Prometheus lines exported by xray-checker, compiled once for both metric parsers.
+_STATUS_RE = re.compile(
+    r'xray_proxy_status\{address="([^"]+)",name="([^"]*)",protocol="([^"]+)"\}\s+([01])'
+)
+_LATENCY_RE = re.compile(
+    r'xray_proxy_latency_ms\{address="([^"]+)",name="([^"]*)",protocol="([^"]+)"\}\s+(\d+(?:\.\d+)?)'
+)
+
 def _find_free_port(start_port: int = 2112, max_attempts: int = 1000) -> int:
     """
-    Find a free port starting from the given port number.
+    Find and claim a free port starting from the given port number.
+    A port is never returned twice in one process, so concurrent checks
+    cannot be handed the same port before their binaries bind it.
 
     Args:
         start_port (int): Starting port number to check
@@ -27,19 +62,123 @@ def _find_free_port(start_port: int = 2112, max_attempts: int = 1000) -> int:
     Raises:
         Exception: If no free port is found
     """
-    for port in range(start_port, start_port + max_attempts):
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind(("localhost", port))
-                return port
-        except OSError:
-            continue
+    with _claimed_ports_lock:
+        for port in range(start_port, start_port + max_attempts):
+            if port in _claimed_ports:
+                continue
+            try:
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                    # Go listeners set SO_REUSEADDR, so a port that only has
+                    # TIME_WAIT connections left is usable by the binary too.
+                    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    s.bind(("localhost", port))
+            except OSError:
+                continue
+            _claimed_ports.add(port)
+            return port
 
     raise Exception(
         f"No free port found in range {start_port}-{start_port + max_attempts}"
     )
 
 
+def _release_port(port: int) -> None:
+    """Return a port claimed by _find_free_port once its binary has exited."""
+    with _claimed_ports_lock:
+        _claimed_ports.discard(port)
+
+
+def _read_process_log(log_file) -> str:
+    """Return everything a subprocess has written to its (temporary) log file."""
+    log_file.flush()
+    log_file.seek(0)
+    return log_file.read().strip()
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, max_wait: float = STARTUP_WAIT) -> bool:
+    """
+    Poll localhost:port with exponential backoff until something accepts connections.
+
+    Returns:
+        bool: True once the port is open, False if the process exits or max_wait passes
+    """
+    deadline = time.monotonic() + max_wait
+    delay = 0.01
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(("localhost", port)) == 0:
+                return True
+        time.sleep(delay)
+        delay = min(delay * 2, 0.8)
+    return False
+
+
+def _get_local(session: requests.Session, url: str, read_timeout: float) -> requests.Response:
+    """GET a loopback URL, retrying only refused connections with longer connect timeouts."""
+    for connect_timeout in CONNECT_TIMEOUTS[:-1]:
+        try:
+            return session.get(url, timeout=(connect_timeout, read_timeout))
+        except requests.exceptions.ConnectionError as e:
+            if "refused" not in str(e).lower():
+                raise
+    return session.get(url, timeout=(CONNECT_TIMEOUTS[-1], read_timeout))
+
+
+def _wait_until_healthy(
+    session: requests.Session, port: int, process: subprocess.Popen, deadline: float
+) -> bool:
+    """
+    Poll /health on the port until it answers 200, then confirm that our process
+    is still alive after BIND_GRACE. A listener that is not our child answers
+    just the same, but our binary then exits on its failed bind.
+
+    Returns:
+        bool: True if the healthy listener is our process, False if the process
+        exits or the deadline (a time.time() value) passes first
+    """
+    delay = 0.05
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            response = _get_local(session, f"http://localhost:{port}/health", 5)
+            if response.status_code == 200:
+                time.sleep(BIND_GRACE)
+                return process.poll() is None
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.8)
+    return False
+
+
+def parse_subscription_text(text: str) -> List[str]:
+    """
+    Extract proxy URLs from plain-text subscription data (one URL per line).
+    Supports VLESS, VMess, Shadowsocks, and Trojan protocols.
+
+    Args:
+        text (str): Decoded subscription data
+
+    Returns:
+        List[str]: List of proxy URLs
+    """
+    # Split by newlines and filter out empty lines
+    # Support all major proxy protocols
+    proxy_urls = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if line and any(
+            line.startswith(protocol)
+            for protocol in ["vless://", "ss://", "trojan://", "shadowsocks://"]
+        ):
+            proxy_urls.append(line)
+
+    return proxy_urls
+
+
 def parse_base64_subscription(base64_data: str) -> List[str]:
     """
     Parse base64-encoded subscription data and extract proxy URLs.
@@ -54,19 +193,7 @@ def parse_base64_subscription(base64_data: str) -> List[str]:
     try:
         # Decode base64 data
         decoded_data = base64.b64decode(base64_data).decode("utf-8")
-
-        # Split by newlines and filter out empty lines
-        # Support all major proxy protocols
-        proxy_urls = []
-        for line in decoded_data.split("\n"):
-            line = line.strip()
-            if line and any(
-                line.startswith(protocol)
-                for protocol in ["vless://", "ss://", "trojan://", "shadowsocks://"]
-            ):
-                proxy_urls.append(line)
-
-        return proxy_urls
+        return parse_subscription_text(decoded_data)
     except Exception as e:
         raise Exception(f"Failed to parse base64 subscription data: {e}")
 
@@ -223,6 +350,7 @@ def _check_xray_subscription(
     timeout: int = 30,
     check_interval: int = 10,
     preferred_port: int = 2112,
+    proxy_urls: Optional[List[str]] = None,
 ) -> List[str]:
     """
     Run xray-checker binary with base64-encoded subscription data and return working proxy URLs.
@@ -235,6 +363,7 @@ def _check_xray_subscription(
         timeout (int): Maximum time to wait for checks to complete (seconds)
         check_interval (int): Interval between status checks (seconds)
         preferred_port (int): Preferred port for metrics (will find free port starting from this)
+        proxy_urls (List[str], optional): Already-parsed URLs of the subscription, to skip decoding it again
 
     Returns:
         List[str]: List of working proxy URLs
@@ -262,11 +391,16 @@ def _check_xray_subscription(
                 binary_path += ".exe"
 
     process = None
+    output_log = None
+    metrics_port = None
+    # One keep-alive connection for all health/metrics polls of this run
+    session = requests.Session()
 
     try:
-        # Parse the base64 subscription data
-        logger.info("Parsing base64 subscription data...")
-        proxy_urls = parse_base64_subscription(subscription_base64)
+        # Parse the base64 subscription data unless the caller already did
+        if proxy_urls is None:
+            logger.info("Parsing base64 subscription data...")
+            proxy_urls = parse_base64_subscription(subscription_base64)
         logger.info(f"Found {len(proxy_urls)} proxies in subscription")
 
         # Extract proxy information for matching
@@ -284,43 +418,63 @@ def _check_xray_subscription(
 
         logger.info(f"Protocol distribution: {protocol_counts}")
 
-        # Find a free port for metrics
-        metrics_port = _find_free_port(preferred_port)
-        logger.info(f"Using port {metrics_port} for metrics")
-
         # Set up environment variables for the binary
         env = os.environ.copy()
         env["SUBSCRIPTION_URL"] = subscription_base64  # Pass the base64 data directly
 
-        # Prepare command with metrics port argument
-        cmd = [binary_path, f"--metrics-port={metrics_port}"]
-
-        # Start xray-checker binary
-        logger.info(f"Starting xray-checker binary: {' '.join(cmd)}")
-
-        process = subprocess.Popen(
-            cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-        )
-
-        # Wait for the service to start
-        logger.info("Waiting for xray-checker service to start...")
-        time.sleep(15)
-
-        # Check if process is still running
-        if process.poll() is not None:
-            stdout, stderr = process.communicate()
-            logger.error(f"Binary exited early. Stdout: {stdout}, Stderr: {stderr}")
-            raise Exception(f"xray-checker binary failed to start: {stderr}")
-
-        # Wait for checks to complete and get working proxies
-        start_time = time.time()
+        # Another process can still take the port between our bind test and the
+        # binary's own bind, so a bind failure is retried on the next free port.
+        for attempt in range(1, PORT_ATTEMPTS + 1):
+            # Find a free port for metrics
+            metrics_port = _find_free_port(preferred_port)
+            logger.info(f"Using port {metrics_port} for metrics")
+
+            # Prepare command with metrics port argument
+            cmd = [binary_path, f"--metrics-port={metrics_port}"]
+
+            # Start xray-checker binary
+            logger.info(f"Starting xray-checker binary: {' '.join(cmd)}")
+
+            # Output goes to a temporary file rather than a pipe: nothing reads a pipe
+            # while we poll, and a full 64KB pipe buffer would block xray-checker.
+            output_log = tempfile.TemporaryFile(mode="w+", encoding="utf-8", errors="replace")
+            launched_at = time.time()
+            process = subprocess.Popen(
+                cmd, env=env, stdout=output_log, stderr=subprocess.STDOUT
+            )
+
+            # Wait for the metrics port to open rather than sleeping a fixed time.
+            # An open port alone is not enough: if another process won the port,
+            # it accepts our connections while our binary fails its bind.
+            logger.info("Waiting for xray-checker service to start...")
+            if _wait_for_port(metrics_port, process) and _wait_until_healthy(
+                session, metrics_port, process, launched_at + STARTUP_WAIT
+            ):
+                break
+            if process.poll() is None:
+                raise Exception(
+                    f"xray-checker did not become healthy on port {metrics_port} "
+                    f"within {STARTUP_WAIT}s"
+                )
+            output = _read_process_log(output_log)
+            output_log.close()
+            if attempt < PORT_ATTEMPTS and "address already in use" in output.lower():
+                logger.warning(f"Port {metrics_port} was taken before binding, retrying...")
+                _release_port(metrics_port)
+                continue
+            logger.error(f"Binary exited early. Output: {output}")
+            raise Exception(f"xray-checker binary failed to start: {output}")
+
+        # Wait for checks to complete and get working proxies. The deadline keeps
+        # the old budget (startup wait + timeout) even when startup is fast.
+        deadline = launched_at + STARTUP_WAIT + timeout
         working_proxy_urls = []
 
-        while time.time() - start_time < timeout:
+        while time.time() < deadline:
             try:
                 # Check if service is healthy
-                health_response = requests.get(
-                    f"http://localhost:{metrics_port}/health", timeout=5
+                health_response = _get_local(
+                    session, f"http://localhost:{metrics_port}/health", 5
                 )
                 if health_response.status_code != 200:
                     logger.info("Service not ready yet, waiting...")
@@ -328,11 +482,13 @@ def _check_xray_subscription(
                     continue
 
                 # Get metrics
-                metrics_response = requests.get(
-                    f"http://localhost:{metrics_port}/metrics", timeout=10
+                metrics_response = _get_local(
+                    session, f"http://localhost:{metrics_port}/metrics", 10
                 )
                 if metrics_response.status_code == 200:
                     if len(metrics_response.text.split("\n")) < proxy_no * 2 + 4:
+                        # Not every proxy has been checked yet; poll again shortly
+                        time.sleep(1)
                         continue
                     working_proxy_urls = _parse_metrics_and_match_urls(
                         metrics_response.text, proxy_info_list
@@ -354,9 +510,8 @@ def _check_xray_subscription(
 
             # Check if process is still alive
             if process.poll() is not None:
-                stdout, stderr = process.communicate()
                 logger.error(
-                    f"Process died unexpectedly. Stdout: {stdout}, Stderr: {stderr}"
+                    f"Process died unexpectedly. Output: {_read_process_log(output_log)}"
                 )
                 break
 
@@ -376,6 +531,8 @@ def _check_xray_subscription(
         raise
 
     finally:
+        session.close()
+
         # Clean up process
         if process and process.poll() is None:
             logger.info("Terminating xray-checker process...")
@@ -391,6 +548,13 @@ def _check_xray_subscription(
             except Exception as e:
                 logger.warning(f"Error during process cleanup: {e}")
 
+        if output_log is not None:
+            output_log.close()
+
+        # The process is gone, so its port can be handed out again
+        if metrics_port is not None:
+            _release_port(metrics_port)
+
 
 def _parse_metrics_and_match_urls(
     metrics_text: str, proxy_info_list: List[Dict]
@@ -409,11 +573,8 @@ def _parse_metrics_and_match_urls(
     working_proxy_urls = []
 
     # Parse proxy status metrics - updated pattern to handle more protocols
-    status_pattern = r'xray_proxy_status\{address="([^"]+)",name="([^"]*)",protocol="([^"]+)"\}\s+([01])'
-    latency_pattern = r'xray_proxy_latency_ms\{address="([^"]+)",name="([^"]*)",protocol="([^"]+)"\}\s+(\d+(?:\.\d+)?)'
-
-    status_matches = re.findall(status_pattern, metrics_text)
-    latency_matches = re.findall(latency_pattern, metrics_text)
+    status_matches = _STATUS_RE.findall(metrics_text)
+    latency_matches = _LATENCY_RE.findall(metrics_text)
 
     # Create a dictionary for quick latency lookup
     latency_dict = {}
@@ -421,50 +582,35 @@ def _parse_metrics_and_match_urls(
         key = (address, name, protocol)
         latency_dict[key] = float(latency)
 
+    # Index the proxies once per matching strategy (first occurrence wins), so
+    # each working proxy is a few dict lookups instead of a scan of the list.
+    by_address = {}  # Strategy 1: exact match on protocol and address
+    by_host_port = {}  # Strategy 2: match by protocol and host:port
+    by_name = {}  # Strategy 3: match by name and protocol (fallback)
+    by_normalized = {}  # Strategy 4: protocol normalization (ss vs shadowsocks)
+    for position, proxy_info in enumerate(proxy_info_list):
+        by_address.setdefault((proxy_info["protocol"], proxy_info["address"]), position)
+        if proxy_info.get("host") and proxy_info.get("port"):
+            host_port = f"{proxy_info['host']}:{proxy_info['port']}"
+            by_host_port.setdefault((proxy_info["protocol"], host_port), position)
+        by_name.setdefault((proxy_info["name"], proxy_info["protocol"]), position)
+        by_normalized.setdefault(
+            (_normalize_protocol(proxy_info["protocol"]), proxy_info["address"]),
+            position,
+        )
+
     # Process status matches and find corresponding URLs
     for address, name, protocol, status in status_matches:
         if status == "1":  # Working proxy
-            # Find matching proxy URL from original list
-            matching_proxy = None
-
-            # Try multiple matching strategies
-            for proxy_info in proxy_info_list:
-                # Strategy 1: Exact match on protocol and address
-                if (
-                    proxy_info["protocol"] == protocol
-                    and proxy_info["address"] == address
-                ):
-                    matching_proxy = proxy_info
-                    break
-
-                # Strategy 2: Match by protocol and host:port separately
-                if (
-                    proxy_info["protocol"] == protocol
-                    and proxy_info.get("host")
-                    and proxy_info.get("port")
-                    and f"{proxy_info['host']}:{proxy_info['port']}" == address
-                ):
-                    matching_proxy = proxy_info
-                    break
-
-                # Strategy 3: Match by name and protocol (fallback)
-                if (
-                    proxy_info["name"] == name
-                    and proxy_info["protocol"] == protocol
-                    and name
-                    and name != "unknown"
-                ):
-                    matching_proxy = proxy_info
-                    break
-
-                # Strategy 4: Protocol normalization (ss vs shadowsocks)
-                normalized_protocol = _normalize_protocol(proxy_info["protocol"])
-                if (
-                    normalized_protocol == _normalize_protocol(protocol)
-                    and proxy_info["address"] == address
-                ):
-                    matching_proxy = proxy_info
-                    break
+            # The earliest proxy satisfying any strategy, as a scan of the list would find
+            positions = [
+                by_address.get((protocol, address)),
+                by_host_port.get((protocol, address)),
+                by_name.get((name, protocol)) if name and name != "unknown" else None,
+                by_normalized.get((_normalize_protocol(protocol), address)),
+            ]
+            positions = [position for position in positions if position is not None]
+            matching_proxy = proxy_info_list[min(positions)] if positions else None
 
             if matching_proxy:
                 working_proxy_urls.append(matching_proxy["url"])
@@ -500,11 +646,8 @@ def _parse_metrics(metrics_text: str) -> List[Dict[str, any]]:
     working_proxies = []
 
     # Parse proxy status metrics
-    status_pattern = r'xray_proxy_status\{address="([^"]+)",name="([^"]*)",protocol="([^"]+)"\}\s+([01])'
-    latency_pattern = r'xray_proxy_latency_ms\{address="([^"]+)",name="([^"]*)",protocol="([^"]+)"\}\s+(\d+(?:\.\d+)?)'
-
-    status_matches = re.findall(status_pattern, metrics_text)
-    latency_matches = re.findall(latency_pattern, metrics_text)
+    status_matches = _STATUS_RE.findall(metrics_text)
+    latency_matches = _LATENCY_RE.findall(metrics_text)
 
     # Create a dictionary for quick latency lookup
     latency_dict = {}
@@ -619,11 +762,12 @@ def _check_xray_subscription_with_config_file(
         if temp_config and os.path.exists(temp_config):
             os.unlink(temp_config)
 
-def get_working_proxies(base64_subscription: str):
+def get_working_proxies(base64_subscription: str, proxy_urls: Optional[List[str]] = None):
     try:
-        # Test parsing base64 data first
-        print("Parsing base64 subscription data...")
-        proxy_urls = parse_base64_subscription(base64_subscription)
+        # Test parsing base64 data first (unless the URLs were parsed already)
+        if proxy_urls is None:
+            print("Parsing base64 subscription data...")
+            proxy_urls = parse_base64_subscription(base64_subscription)
         print(f"Found {len(proxy_urls)} proxies:")
 
         # Group by protocol for better display
@@ -645,7 +789,7 @@ def get_working_proxies(base64_subscription: str):
 
         # Run the checker
         working_proxy_urls = _check_xray_subscription(
-            base64_subscription, proxy_no=len(proxy_urls)
+            base64_subscription, proxy_no=len(proxy_urls), proxy_urls=proxy_urls
         )
 
         print(f"\nFound {len(working_proxy_urls)} working proxies:")
@@ -677,6 +821,17 @@ def get_working_proxies(base64_subscription: str):
         print(f"❌ Error: {e}")
         return None
 
+def get_working_proxies_from_text(content: str):
+    """
+    Same as get_working_proxies, for plain-text subscription content.
+    The URLs are parsed straight from the text; it is base64-encoded only once,
+    because xray-checker takes the subscription that way.
+    """
+    subscription_base64 = base64.b64encode(content.encode("utf-8")).decode("ascii")
+    return get_working_proxies(
+        subscription_base64, proxy_urls=parse_subscription_text(content)
+    )
+
 # Example usage
 if __name__ == "__main__":
     # Example base64 subscription data with mixed protocols
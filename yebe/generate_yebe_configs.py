@@ -2,22 +2,30 @@ import requests
 import re
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from typing import Dict, List
 
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from create_configs_json import build_config
 from country_utils import code_to_flag, country_name_from_code
-import json
+from json_utils import write_json
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Concurrent requests per fan-out; stays under the session's default pool size (10).
+MAX_FETCH_WORKERS = 8
+
+COUNTRY_CODE_RE = re.compile(r"^[A-Z]{2}$")
+
 
 class CountryDataFetcher:
     def __init__(self):
         self.base_url = os.getenv("BASE_URL")
         self.github_api_url = os.getenv("GGITHUB_API_URL")
+        # One pooled session for every request this fetcher makes (same host per country)
+        self.session = requests.Session()
 
     def get_flag_emoji(self, country_code: str) -> str:
         """Convert ISO 3166-1 alpha-2 country code to flag emoji"""
@@ -34,7 +42,7 @@ class CountryDataFetcher:
         """Fetch all available country codes from the GitHub repository"""
         try:
             print("🔍 Fetching available country codes from GitHub...")
-            response = requests.get(self.github_api_url, timeout=10)
+            response = self.session.get(self.github_api_url, timeout=10)
 
             if response.status_code == 200:
                 files = response.json()
@@ -43,7 +51,7 @@ class CountryDataFetcher:
                 for file_info in files:
                     if file_info["type"] == "file":
                         filename = file_info["name"]
-                        if re.match(r"^[A-Z]{2}$", filename):
+                        if COUNTRY_CODE_RE.match(filename):
                             country_codes.append(filename)
 
                 country_codes.sort()
@@ -96,25 +104,34 @@ class CountryDataFetcher:
         ]
         available_codes = []
 
-        for code in common_codes:
-            try:
-                url = f"{self.base_url}{code}"
-                response = requests.head(url, timeout=5)
-                if response.status_code == 200:
-                    available_codes.append(code)
-                    print(f"✅ {code} - Available")
-                else:
-                    print(f"❌ {code} - Not found")
-            except:
+        # Probes are independent network waits, so they run concurrently;
+        # results are still reported in the original order.
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+            statuses = list(executor.map(self._probe_country_code, common_codes))
+
+        for code, status in zip(common_codes, statuses):
+            if status == 200:
+                available_codes.append(code)
+                print(f"✅ {code} - Available")
+            elif status is None:
                 print(f"❌ {code} - Error checking")
+            else:
+                print(f"❌ {code} - Not found")
 
         return available_codes
 
+    def _probe_country_code(self, code: str):
+        """HEAD request for a country file; returns the status code, or None on error"""
+        try:
+            return self.session.head(f"{self.base_url}{code}", timeout=5).status_code
+        except Exception:
+            return None
+
     def fetch_country_data(self, country_code: str) -> Dict:
         """Fetch data for a specific country code"""
         url = f"{self.base_url}{country_code.upper()}"
         try:
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             return {
                 "country_code": country_code.upper(),
@@ -138,11 +155,11 @@ class CountryDataFetcher:
 
     def fetch_multiple_countries(self, country_codes: List[str]) -> List[Dict]:
         """Fetch data for multiple country codes"""
-        results = []
-        for code in country_codes:
-            print(f"Fetching data for {code}...")
-            result = self.fetch_country_data(code)
-            results.append(result)
+        print(f"Fetching data for {', '.join(country_codes)}...")
+        # Downloads overlap; map() keeps the results in country_codes order.
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+            results = list(executor.map(self.fetch_country_data, country_codes))
+        for result in results:
             if result["status"] == "success":
                 print(
                     f"✅ {result['flag_emoji']} {result['country_name']} - {result['content_length']} characters"
@@ -216,8 +233,7 @@ if __name__ == "__main__":
                 if config:
                     configs.append(config)
                 # print(f"   {r['flag_emoji']} {r['country_name']} ({r['country_code']}) - {r['content_length']} chars")
-            with open("configs.json", "w", encoding="utf-8") as f:
-                json.dump(configs, f, indent=4, ensure_ascii=False)
+            write_json("configs.json", configs)
             # print(f"\n📈 Top 5 countries by content size:")
             # top5 = sorted(successful, key=lambda x: x['content_length'], reverse=True)[:5]
             # for r in top5: